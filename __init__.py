@@ -9,47 +9,489 @@
 # WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
 # See the License for the specific language governing permissions and
 # limitations under the License.
-from os.path import dirname, join
-
-import simplematch
+import asyncio
+import hashlib
+import json
+import sqlite3
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from copy import deepcopy
+from functools import lru_cache, partial, wraps
+from itertools import chain, groupby, islice
+from os import makedirs
+from os.path import dirname, isfile, join
+from queue import Empty, Queue
+from threading import Lock, Thread
+from urllib.parse import quote
+
+import requests
 import wikipedia_for_humans
-from ovos_classifiers.heuristics.keyword_extraction import HeuristicExtractor
 from ovos_plugin_manager.templates.solvers import QuestionSolver
 from ovos_utils import classproperty
 from ovos_utils.intents import IntentBuilder
 from ovos_utils.gui import can_use_gui
+from ovos_utils.log import LOG
 from ovos_utils.process_utils import RuntimeRequirements
+from ovos_utils.xdg_utils import xdg_cache_home
 from ovos_workshop.decorators import intent_handler
 from ovos_workshop.skills.common_query_skill import CommonQuerySkill, CQSMatchLevel
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from wikipedia_for_humans.util import summarize
+
+
+_UI_DIR = join(dirname(__file__), "ui")
+_JUMPING_GIF = join(_UI_DIR, "jumping.gif")
+if not isfile(_JUMPING_GIF):
+    LOG.warning(f"missing search animation: {_JUMPING_GIF}")
+
+_MISS = object()
+_EXECUTOR = ThreadPoolExecutor(max_workers=4)
+# keep-alive connections to wikipedia shared by every lookup
+_SESSION = requests.Session()
+# required by the wikimedia REST api policy
+_SESSION.headers["User-Agent"] = ("skill-ovos-wikipedia "
+                                  "(https://github.com/OpenVoiceOS/skill-ovos-wikipedia)")
+_SESSION.mount("https://", HTTPAdapter(pool_connections=4, pool_maxsize=16,
+                                       max_retries=Retry(total=2, backoff_factor=0.2)))
+# lang -> "{subquery} of {query}" templates
+_SECONDARY_SEARCH = {
+    "en": ["what is the {subquery} of {query}"]
+}
+
+
+@lru_cache(maxsize=64)
+def _primary(lang):
+    return lang.split("-")[0]
+
+
+# the nlp dependencies are slow to import, only load them once needed
+@lru_cache(maxsize=None)
+def _get_extractor():
+    from ovos_classifiers.heuristics.keyword_extraction import HeuristicExtractor
+    return HeuristicExtractor()
+
+
+@lru_cache(maxsize=None)
+def _get_secondary_matchers(lang):
+    import simplematch
+    return [simplematch.Matcher(t) for t in _SECONDARY_SEARCH.get(lang, [])]
+
+
+@lru_cache(maxsize=2048)
+def _extract_subject(query, lang):
+    return _get_extractor().extract_subject(query, lang)
+
+
+class WikiCache:
+    """TTL bounded LRU cache for wikipedia results
+
+    entries are kept in memory and mirrored to a sqlite db (if a path is given)
+    so they survive restarts, empty results expire after negative_ttl seconds
+
+    expired entries can still be served for stale_ttl seconds while
+    a fresh value is fetched in the background, see lookup
+
+    if the db fails (locked, read only, disk full...) the cache keeps
+    working in memory only
+    """
+    __slots__ = ("ttl", "negative_ttl", "stale_ttl", "max_size", "_entries",
+                 "_refreshing", "_lock", "_db", "_db_lock")
+    schema_version = 1
+
+    def __init__(self, path=None, ttl=86400, negative_ttl=300, max_size=1000,
+                 stale_ttl=0):
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.stale_ttl = stale_ttl
+        self.max_size = max_size
+        self._entries = OrderedDict()  # key -> (value, expires, stale_until)
+        self._refreshing = set()  # keys with a background refresh in flight
+        self._lock = Lock()  # guards the in memory entries
+        self._db = None
+        self._db_lock = Lock()  # guards the sqlite connection
+        if path:
+            try:
+                self._db = self._connect(path)
+            except (OSError, sqlite3.Error) as e:
+                LOG.error(f"wikipedia cache db unavailable, caching in memory only: {e}")
+
+    @staticmethod
+    def make_key(fn_name, query, lang):
+        key = f"{fn_name}:{query.lower().strip()}:{lang}"
+        return hashlib.md5(key.encode()).hexdigest()
+
+    def get(self, key):
+        """return cached value or _MISS if absent/expired"""
+        value, is_stale = self.lookup(key)
+        return _MISS if is_stale else value
+
+    def lookup(self, key):
+        """return (value, is_stale), value is _MISS if absent or past its stale window"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+        if entry is None:
+            entry = self._load(key)
+        if entry is None:
+            return _MISS, False
+        value, expires, stale_until = entry
+        now = time.time()
+        if stale_until < now:
+            self._drop(key)
+            return _MISS, False
+        return value, expires < now
+
+    def set(self, key, value, ttl=None, stale_ttl=None, persist=True):
+        """store value, with persist=False it is only kept in memory"""
+        if ttl is None:
+            ttl = self.ttl if value else self.negative_ttl
+        if stale_ttl is None:
+            stale_ttl = self.stale_ttl
+        expires = time.time() + ttl
+        self._store(key, (value, expires, expires + stale_ttl))
+        if persist:
+            self._write("INSERT OR REPLACE INTO cache VALUES (?, ?, ?, ?)",
+                        [(key, json.dumps(value), expires, expires + stale_ttl)])
+
+    def start_refresh(self, key):
+        """claim the background refresh of key, False if one is already running"""
+        with self._lock:
+            if key in self._refreshing:
+                return False
+            self._refreshing.add(key)
+            return True
+
+    def end_refresh(self, key):
+        with self._lock:
+            self._refreshing.discard(key)
+
+    def _load(self, key):
+        """read key back from the db into memory, None if absent"""
+        with self._db_lock:
+            if self._db is None:
+                return None
+            try:
+                row = self._db.execute("SELECT value, expires, stale_until FROM cache "
+                                       "WHERE key = ?", (key,)).fetchone()
+            except sqlite3.Error as e:
+                self._disable_db(e)
+                return None
+        if row is None:
+            return None
+        entry = (json.loads(row[0]), row[1], row[2])
+        self._store(key, entry)
+        return entry
+
+    def _store(self, key, entry):
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            evicted = []
+            while len(self._entries) > self.max_size:
+                evicted.append((self._entries.popitem(last=False)[0],))
+        if evicted:
+            self._write("DELETE FROM cache WHERE key = ?", evicted)
+
+    def _drop(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+        self._write("DELETE FROM cache WHERE key = ?", [(key,)])
+
+    def _write(self, sql, rows):
+        """run and commit a write on the db"""
+        with self._db_lock:
+            if self._db is None:
+                return
+            try:
+                with self._db:  # commit, or roll back on error
+                    self._db.executemany(sql, rows)
+            except sqlite3.Error as e:
+                self._disable_db(e)
+
+    def _connect(self, path):
+        makedirs(dirname(path), exist_ok=True)
+        db = sqlite3.connect(path, check_same_thread=False)
+        # readers in other processes do not block writes
+        db.execute("PRAGMA journal_mode=WAL")
+        # cached data is disposable, start over if the table layout changed
+        if db.execute("PRAGMA user_version").fetchone()[0] != self.schema_version:
+            db.execute("DROP TABLE IF EXISTS cache")
+            db.execute(f"PRAGMA user_version = {self.schema_version}")
+        db.execute("CREATE TABLE IF NOT EXISTS cache "
+                   "(key TEXT PRIMARY KEY, value TEXT, expires REAL, stale_until REAL)")
+        db.execute("DELETE FROM cache WHERE stale_until < ?", (time.time(),))
+        db.execute("DELETE FROM cache WHERE key NOT IN "
+                   "(SELECT key FROM cache ORDER BY expires DESC LIMIT ?)",
+                   (self.max_size,))
+        db.commit()
+        return db
+
+    def _disable_db(self, error):
+        """keep going in memory only after a db failure, called with _db_lock held"""
+        LOG.error(f"wikipedia cache db failed, caching in memory only: {error}")
+        try:
+            self._db.close()
+        except sqlite3.Error:
+            pass
+        self._db = None
+
+
+class _Degraded:
+    """result built while some lookups failed, see cached"""
+    __slots__ = ("value",)
+
+    def __init__(self, value):
+        self.value = value
+
+
+def cached(ttl=None, valid=bool, revalidate=False, persist=True):
+    """cache a WikipediaSolver method in self.wiki_cache
+
+    the key is derived from (method name, positional args, lang),
+    results failing the valid check or wrapped in _Degraded are kept for
+    negative_ttl only, with persist=False results are only kept in memory
+
+    with revalidate=True stale entries are returned immediately
+    and refreshed in a background thread"""
+
+    def decorator(func):
+        def refresh(self, key, *args, lang="en"):
+            value = func(self, *args, lang=lang)
+            if isinstance(value, _Degraded):
+                value = value.value
+                self.wiki_cache.set(key, value, self.wiki_cache.negative_ttl,
+                                    stale_ttl=0, persist=persist)
+            elif valid(value):
+                self.wiki_cache.set(key, value, ttl, persist=persist)
+            else:
+                self.wiki_cache.set(key, value, self.wiki_cache.negative_ttl,
+                                    stale_ttl=0, persist=persist)
+            return value
+
+        def background_refresh(self, key, *args, lang="en"):
+            try:
+                value = func(self, *args, lang=lang)
+                # keep serving the stale value rather than replacing it with a failure
+                if not isinstance(value, _Degraded) and valid(value):
+                    self.wiki_cache.set(key, value, ttl, persist=persist)
+            except Exception as e:
+                LOG.error(f"failed to refresh {func.__name__}: {e}")
+            finally:
+                self.wiki_cache.end_refresh(key)
+
+        @wraps(func)
+        def wrapper(self, *args, lang="en"):
+            query = " | ".join(args)
+            key = WikiCache.make_key(func.__name__, query, lang)
+            if revalidate:
+                value, is_stale = self.wiki_cache.lookup(key)
+            else:
+                value, is_stale = self.wiki_cache.get(key), False
+            if value is not _MISS:
+                if is_stale:
+                    LOG.debug(f"wikipedia cache STALE: {func.__name__}({query}, lang={lang})")
+                    if self.wiki_cache.start_refresh(key):
+                        Thread(target=background_refresh, args=(self, key, *args),
+                               kwargs={"lang": lang}, daemon=True).start()
+                else:
+                    LOG.debug(f"wikipedia cache HIT: {func.__name__}({query}, lang={lang})")
+                return value
+            LOG.debug(f"wikipedia cache MISS: {func.__name__}({query}, lang={lang})")
+            return refresh(self, key, *args, lang=lang)
+
+        return wrapper
+
+    return decorator
+
+
+class BatchedWikiClient:
+    """collect lookups arriving within a short window and run them as one concurrent batch
+
+    callers use the direct-style apply(phrase), which blocks until its batch is done
+    or timeout seconds have passed, a lookup with nothing else queued is sent right away"""
+    __slots__ = ("func", "window", "max_batch", "timeout", "_queue", "_executor",
+                 "_thread", "_closed")
+
+    def __init__(self, func, window=0.05, max_batch=8, timeout=None):
+        self.func = func
+        self.window = window
+        self.max_batch = max_batch
+        self.timeout = timeout
+        self._closed = False
+        self._queue = Queue()
+        self._executor = ThreadPoolExecutor(max_workers=max_batch)
+        self._thread = Thread(target=self._worker, daemon=True)
+        self._thread.start()
+
+    def apply(self, phrase):
+        if self._closed:
+            raise RuntimeError("BatchedWikiClient is shut down")
+        future = Future()
+        self._queue.put((phrase, future))
+        return future.result(self.timeout)
+
+    def run_batch(self, phrases):
+        """run func over every phrase concurrently, returns a list of Futures"""
+        return [self._executor.submit(self._call, phrase) for phrase in phrases]
+
+    def shutdown(self):
+        self._closed = True
+        self._queue.put(None)
+        self._executor.shutdown(wait=False)
+
+    def _worker(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                break
+            batch = [item]
+            # only wait for the rest of a burst if one is already arriving
+            window = self.window if not self._queue.empty() else 0
+            deadline = time.monotonic() + window
+            while len(batch) < self.max_batch:
+                try:
+                    item = self._queue.get(timeout=max(0, deadline - time.monotonic()))
+                except Empty:
+                    break
+                if item is None:
+                    self._queue.put(None)  # stop after this batch
+                    break
+                batch.append(item)
+
+            try:
+                results = self.run_batch([phrase for phrase, _ in batch])
+            except Exception as e:  # executor already shut down
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+            # hand results back as they complete, the next burst can start meanwhile
+            for (_, future), result in zip(batch, results):
+                result.add_done_callback(partial(self._resolve, future))
+
+        # fail lookups queued while shutting down instead of leaving them hanging
+        while True:
+            try:
+                item = self._queue.get_nowait()
+            except Empty:
+                return
+            if item is not None:
+                item[1].set_exception(RuntimeError("BatchedWikiClient is shut down"))
+
+
+    def _call(self, phrase):
+        # lookups still waiting for a thread when shut down are not started
+        if self._closed:
+            raise RuntimeError("BatchedWikiClient is shut down")
+        return self.func(phrase)
+
+    @staticmethod
+    def _resolve(future, result):
+        try:
+            future.set_result(result.result())
+        except Exception as e:
+            future.set_exception(e)
 
 
 class WikipediaSolver(QuestionSolver):
     priority = 40
     enable_tx = True
+    _warmed = False
 
     def __init__(self, config=None):
         config = config or {}
         config["lang"] = "en"  # only supports english
         super().__init__(config)
-        self.cache.clear()
+        # a cache_path of None keeps the cache in memory only
+        self.wiki_cache = WikiCache(
+            path=self.config.get("cache_path",
+                                 join(xdg_cache_home(), "neon_solvers", "WikipediaSolver.db")),
+            ttl=self.config.get("cache_ttl", 86400),
+            negative_ttl=self.config.get("negative_cache_ttl", 300),
+            max_size=self.config.get("cache_size", 1000),
+            stale_ttl=self.config.get("cache_stale_ttl", 604800))
+        self.timeout = self.config.get("timeout", 8)
+        self._split = lru_cache(maxsize=512)(self._sentence_split)
+        self._default_primary = _primary(self.default_lang)
+        # wikipedia_for_humans calls requests.get directly, route it through the session
+        wikipedia_for_humans.requests = _SESSION
+        if self.config.get("warmup", True) and not WikipediaSolver._warmed:
+            WikipediaSolver._warmed = True
+            Thread(target=self._warmup, daemon=True).start()
+
+    @staticmethod
+    def _warmup():
+        """load nltk models and open the connection to wikipedia
+        before the first real query needs them"""
+        try:
+            _get_extractor().extract_subject("warmup", "en")
+            wikipedia_for_humans.summary("Python", lang="en")
+        except Exception as e:
+            LOG.debug(f"wikipedia warmup failed: {e}")
+
+    # cached wikipedia_for_humans calls
+    # page_data is persisted as part of _fetch_all, keep it in memory only
+    @cached(persist=False)
+    def _page_data(self, query, lang="en"):
+        return wikipedia_for_humans.page_data(query, lang=lang) or {}
+
+    @cached()
+    def _tldr(self, query, lang="en"):
+        return wikipedia_for_humans.tldr(query, lang=lang)
+
+    @cached()
+    def _summary(self, query, lang="en"):
+        return wikipedia_for_humans.summary(query, lang=lang)
+
+    @cached()
+    def _rest_summary(self, title, lang="en"):
+        """title, extract and image of a page in a single REST api request"""
+        url = (f"https://{lang}.wikipedia.org/api/rest_v1/page/summary/"
+               f"{quote(title.strip().replace(' ', '_'), safe='')}")
+        response = _SESSION.get(url, timeout=self.timeout)
+        if response.status_code == 404:
+            return {}
+        response.raise_for_status()
+        data = response.json()
+        if data.get("type") != "standard":  # disambiguation pages
+            return {}
+        image = (data.get("originalimage") or data.get("thumbnail") or {}).get("source")
+        return {"title": data.get("title"),
+                "summary": data.get("extract", ""),
+                "images": [image] if image else []}
+
+    @cached()
+    def _tldr_about(self, subquery, query, lang="en"):
+        return wikipedia_for_humans.tldr_about(subquery, query, lang=lang)
+
+    @cached()
+    def _ask_about(self, subquery, query, lang="en"):
+        return wikipedia_for_humans.ask_about(subquery, query, lang=lang)
+
+    def _query_lang(self, context):
+        if context and context.get("lang"):
+            return _primary(context["lang"])
+        return self._default_primary
+
+    def _sentence_split(self, text):
+        return tuple(self.sentence_split(text, -1))
 
     def extract_keyword(self, query, lang="en"):
         # TODO - from mycroft.conf
-        keyword_extractor = HeuristicExtractor()
-        return keyword_extractor.extract_subject(query, lang)
+        return _extract_subject(query.strip(), lang)
 
     def get_secondary_search(self, query, lang="en"):
-        if lang == "en":
-            match = simplematch.match("what is the {subquery} of {query}", query)
+        for matcher in _get_secondary_matchers(lang):
+            match = matcher.match(query)
             if match:
                 return match["query"], match["subquery"]
         query = self.extract_keyword(query, lang)
         return query, None
 
     def extract_and_search(self, query, context=None):
-        context = context or {}
-        lang = context.get("lang") or self.default_lang
-        lang = lang.split("-")[0]
+        lang = self._query_lang(context)
 
         # extract the best keyword
         query = self.extract_keyword(query, lang)
@@ -57,56 +499,110 @@ class WikipediaSolver(QuestionSolver):
             return {}
         return self.search(query, context)
 
+    def _parallel(self, *calls, deadline=None):
+        """run independent lookups concurrently, returns (results, failed)
+
+        a lookup that raised or timed out returns None and sets failed,
+        deadline defaults to self.timeout seconds from now"""
+        futures = [_EXECUTOR.submit(call) for call in calls]
+        if deadline is None:
+            deadline = time.monotonic() + self.timeout
+        results = []
+        failed = False
+        for future in futures:
+            try:
+                results.append(future.result(max(0, deadline - time.monotonic())))
+            except Exception as e:
+                LOG.error(f"wikipedia lookup failed: {e!r}")
+                results.append(None)
+                failed = True
+        return results, failed
+
+    @cached(valid=lambda data: bool(data.get("summary")), revalidate=True)
+    def _fetch_all(self, query, lang="en"):
+        """page_data, summary, tldr and images for query in a single lookup
+
+        all stages share one deadline, the lookup takes at most self.timeout"""
+        deadline = time.monotonic() + self.timeout
+        (page_data,), failed = self._parallel(
+            partial(self._page_data, query, lang=lang), deadline=deadline)
+        page_data = deepcopy(page_data) or {}
+        summ = page_data.get("summary")
+        if summ:
+            short = summarize(summ)
+        elif page_data:
+            (short, summ), failed_summary = self._parallel(
+                partial(self._tldr, query, lang=lang),
+                partial(self._summary, query, lang=lang),
+                deadline=deadline)
+            failed = failed or failed_summary
+        else:
+            query, subquery = self.get_secondary_search(query, lang)
+            if subquery:
+                (short, summ), failed_summary = self._parallel(
+                    partial(self._tldr_about, subquery, query, lang=lang),
+                    partial(self._ask_about, subquery, query, lang=lang),
+                    deadline=deadline)
+            else:
+                # no page found by search, try the page titled after the keyword
+                (rest,), failed_summary = self._parallel(
+                    partial(self._rest_summary, query, lang=lang), deadline=deadline)
+                rest = rest or {}
+                summ = rest.get("summary")
+                if summ:
+                    short = summarize(summ)
+                    page_data.update({"title": rest["title"], "images": rest["images"]})
+                else:
+                    (short, summ), failed_tldr = self._parallel(
+                        partial(self._tldr, query, lang=lang),
+                        partial(self._summary, query, lang=lang),
+                        deadline=deadline)
+                    failed_summary = failed_summary or failed_tldr
+            failed = failed or failed_summary
+        page_data.update({"short_answer": short, "summary": summ or ""})
+        page_data["title"] = page_data.get("title") or query
+        if failed:
+            # answer anyway, but retry the failed lookups once negative_ttl expires
+            return _Degraded(page_data)
+        return page_data
+
     # officially exported Solver methods
     def get_data(self, query, context=None):
         """
        query assured to be in self.default_lang
        return a dict response
        """
-        context = context or {}
-        lang = context.get("lang") or self.default_lang
-        lang = lang.split("-")[0]
-
-        page_data = wikipedia_for_humans.page_data(query, lang=lang) or {}
-        data = {
-            "short_answer": wikipedia_for_humans.tldr(query, lang=lang),
-            "summary": wikipedia_for_humans.summary(query, lang=lang)
-        }
-        if not page_data:
-            query, subquery = self.get_secondary_search(query, lang)
-            if subquery:
-                data = {
-                    "short_answer": wikipedia_for_humans.tldr_about(subquery, query, lang=lang),
-                    "summary": wikipedia_for_humans.ask_about(subquery, query, lang=lang)
-                }
-            else:
-                data = {
-                    "short_answer": wikipedia_for_humans.tldr(query, lang=lang),
-                    "summary": wikipedia_for_humans.summary(query, lang=lang)
-                }
-        page_data.update(data)
-        page_data["title"] = page_data.get("title") or query
-        return page_data
+        lang = self._query_lang(context)
+        return deepcopy(self._fetch_all(query, lang=lang))
+
+    async def aget_data(self, query, context=None):
+        """
+        asyncio version of get_data
+        the blocking lookups run in the default executor
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, self.get_data, query, context)
 
     def get_spoken_answer(self, query, context=None):
         data = self.extract_and_search(query, context)
         return data.get("summary", "")
 
-    def get_image(self, query, context=None):
+    def get_image(self, query, context=None, data=None):
         """
         query assured to be in self.default_lang
         return path/url to a single image to acompany spoken_answer
+
+        data from a previous lookup can be passed to skip the search
         """
-        data = self.extract_and_search(query, context)
-        try:
-            return data["images"][0]
-        except:
-            return None
+        if data is None:
+            data = self.extract_and_search(query, context)
+        images = data.get("images") or []
+        return images[0] if images else None
 
     def get_expanded_answer(self, query, context=None):
         """
         query assured to be in self.default_lang
-        return a list of ordered steps to expand the answer, eg, "tell me more"
+        yield ordered steps to expand the answer, eg, "tell me more"
 
         {
             "title": "optional",
@@ -114,23 +610,86 @@ class WikipediaSolver(QuestionSolver):
             "img": "optional/path/or/url
         }
 
+        sections are only sentence split once the steps reach them
         """
         data = self.get_data(query, context)
-        img = self.get_image(query, context)
-        steps = [{
-            "title": data.get("title", query).title(),
-            "summary": s,
-            "img": img
-        }
-            for s in self.sentence_split(data["summary"], -1)]
-        for sec in data.get("sections", []):
-            steps += [{
-                "title": sec.get("title", query).title(),
-                "summary": s,
-                "img": img
-            }
-                for s in self.sentence_split(sec["text"], -1)]
-        return steps
+        img = self.get_image(query, context, data=data)
+        title = (data.get("title") or query).title()
+        blocks = chain([(title, data["summary"])],
+                       ((sec.get("title", query).title(), sec["text"])
+                        for sec in data.get("sections", [])))
+        for t, text in blocks:
+            for s in self._split(text):
+                yield {"title": t, "summary": s, "img": img}
+
+    def _translate(self, text, target, source):
+        """translate text, results are cached by (sha1(text), source, target)"""
+        if not text:
+            return text
+        digest = hashlib.sha1(text.encode()).hexdigest()
+        key = f"translate:{digest}:{source}:{target}"
+        value = self.wiki_cache.get(key)
+        if value is _MISS:
+            value = self.translator.translate(text, target, source)
+            self.wiki_cache.set(key, value)
+        return value
+
+    def _translate_steps(self, steps, target, source):
+        """
+        translate consecutive steps sharing a title as a single block,
+        one translator call per section instead of one per sentence
+        """
+        for title, block in groupby(steps, key=lambda s: s.get("title")):
+            block = list(block)
+            text = self._translate(" ".join(s["summary"] for s in block),
+                                   target, source)
+            title = self._translate(title, target, source)
+            img = block[0].get("img")
+            for sentence in self.sentence_split(text, None):
+                yield {"title": title, "summary": sentence, "img": img}
+
+    def long_answer(self, query, context=None, lang=None):
+        """
+        return a list of ordered steps to expand the answer, eg, "tell me more"
+        the first step also carries the page "image", so callers
+        do not need a separate get_image lookup
+
+        see iter_long_answer to only compute the steps as they are needed
+        """
+        return list(self.iter_long_answer(query, context, lang))
+
+    def iter_long_answer(self, query, context=None, lang=None):
+        """
+        iterator version of long_answer
+
+        the first step is computed right away, the remaining ones lazily,
+        the iterator is empty if there is no answer
+        """
+        user_lang = self._get_user_lang(context, lang)
+        query, context, lang = self._tx_query(query, context, lang)
+        steps = iter(self.get_expanded_answer(query, context))
+        first = next(steps, None)
+
+        # use spoken_answer as last resort
+        if first is None:
+            summary = self.get_spoken_answer(query, context)
+            if summary:
+                img = self.get_image(query, context)
+                steps = iter([{"title": query, "summary": step0, "img": img}
+                              for step0 in self.sentence_split(summary, -1)])
+                first = next(steps, None)
+        if first is None:
+            return iter([])
+        image = first.get("img")
+
+        # translate english output to user lang
+        if self.enable_tx and user_lang not in self.supported_langs:
+            steps = self._translate_steps(chain([first], steps), user_lang, lang)
+            first = next(steps, None)
+            if first is None:
+                return iter([])
+        first["image"] = image
+        return chain([first], steps)
 
 
 class WikipediaSkill(CommonQuerySkill):
@@ -142,12 +701,23 @@ class WikipediaSkill(CommonQuerySkill):
         else:
             lang = self.lang.split("-")[0]
         self.wiki = WikipediaSolver(config={"lang": lang})
+        # common query probes several phrasings at once, look them up together
+        # the wikipedia lookup is bounded by the solver timeout,
+        # allow as much again for translating the query and the first block
+        self.batcher = BatchedWikiClient(self._search_wiki, timeout=2 * self.wiki.timeout)
+        # queries that recently returned nothing, skip the solver for those
+        self.misses = WikiCache(ttl=300)
+        # common query answers, several phrasings of one utterance hit this
+        self.answers = WikiCache(ttl=300, max_size=256)
 
         # for usage in tell me more / follow up questions
-        self.idx = 0
-        self.results = []
+        self.results = iter([])
         self.image = None
 
+    def initialize(self):
+        # settings are only available once the skill is started
+        self.misses.ttl = self.settings.get("negative_cache_ttl", self.misses.ttl)
+
     @classproperty
     def runtime_requirements(self):
         return RuntimeRequirements(
@@ -168,7 +738,7 @@ class WikipediaSkill(CommonQuerySkill):
         """Extract what the user asked about and reply with info
         from wikipedia.
         """
-        self.gui.show_animated_image(join(dirname(__file__), "ui", "jumping.gif"))
+        self.gui.show_animated_image(_JUMPING_GIF)
         self.current_title = query = message.data["query"]
         self.speak_dialog("searching", {"query": query})
         self.image = None
@@ -181,7 +751,7 @@ class WikipediaSkill(CommonQuerySkill):
     # @intent_handler("wikiroulette.intent")
     def handle_wiki_roulette_query(self, message):
         """Random wikipedia page"""
-        self.gui.show_animated_image(join(dirname(__file__), "ui", "jumping.gif"))
+        self.gui.show_animated_image(_JUMPING_GIF)
         self.image = None
         self.current_title = "Wiki Roulette"
         self.speak_dialog("wikiroulette")
@@ -198,15 +768,31 @@ class WikipediaSkill(CommonQuerySkill):
 
     # common query
     def CQS_match_query_phrase(self, phrase):
-        title, summary = self.ask_the_wiki(phrase)
-        if summary:
-            self.idx += 1  # spoken by common query
-            return (
-                phrase,
-                CQSMatchLevel.GENERAL,
-                summary,
-                {"query": phrase, "image": self.image, "title": title, "answer": summary},
-            )
+        key = WikiCache.make_key("CQS_match_query_phrase", phrase, self.lang)
+        answer = self.answers.get(key)
+        if answer is _MISS:
+            try:
+                title, summary = self.ask_the_wiki(phrase, lookup=self.batcher.apply)
+            except Exception as err:  # lookup timed out or the skill is shutting down
+                self.log.error(f"wikipedia lookup failed: {err!r}")
+                return None
+            if not summary:
+                return None
+            next(self.results, None)  # spoken by common query
+            answer = {"title": title, "summary": summary, "image": self.image}
+            self.answers.set(key, answer)
+        else:
+            # answered recently, the solver is only needed again for "tell me more"
+            self.set_context("WikiKnows", phrase)
+            self.image = answer["image"]
+            self.results = islice(self._lazy_answer(phrase), 1, None)
+        return (
+            phrase,
+            CQSMatchLevel.GENERAL,
+            answer["summary"],
+            {"query": phrase, "image": answer["image"], "title": answer["title"],
+             "answer": answer["summary"]},
+        )
 
     def CQS_action(self, phrase, data):
         """If selected show gui"""
@@ -214,21 +800,37 @@ class WikipediaSkill(CommonQuerySkill):
         self.set_context("WikiKnows", data.get("title") or phrase)
 
     # wikipedia
-    def ask_the_wiki(self, query):
+    def ask_the_wiki(self, query, lookup=None):
         # context for follow up questions
         self.set_context("WikiKnows", query)
-        self.idx = 0
+        self.results = iter([])
+        self.image = None
+        lookup = lookup or self._search_wiki
+        miss_key = WikiCache.make_key("ask_the_wiki", query, self.lang)
+        if self.misses.get(miss_key) is not _MISS:
+            self.log.debug(f"skipping known wikipedia miss: {query}")
+            return None, None
+
+        results = iter(lookup(query) or [])
+        first = next(results, None)
+        if first is None:
+            self.misses.set(miss_key, {"empty": True})
+            return None, None
+        self.results = chain([first], results)
+        self.image = first.get("image")
+        title = first.get("title") or query
+        return title, first["summary"]
+
+    def _lazy_answer(self, query):
+        """answer steps, looked up on the first next() call"""
+        yield from self._search_wiki(query) or []
+
+    def _search_wiki(self, query):
         try:
-            self.results = self.wiki.long_answer(query, lang=self.lang)
+            return self.wiki.iter_long_answer(query, lang=self.lang)
         except Exception as err:  # handle solver plugin failures, happens in some queries
             self.log.error(err)
-            self.results = None
-
-        self.image = self.wiki.get_image(query)
-        if self.results:
-            title = self.results[0].get("title") or query
-            return title, self.results[0]["summary"]
-        return None, None
+            return None
 
     def display_wiki_entry(self, title="Wikipedia", image=None):
         if not can_use_gui(self.bus):
@@ -238,19 +840,26 @@ class WikipediaSkill(CommonQuerySkill):
             self.gui.show_image(image, title=title, fill=None, override_idle=20, override_animations=True)
 
     def speak_result(self):
-        if self.idx + 1 > len(self.results):
+        try:
+            # later steps are only looked up and translated here
+            step = next(self.results, None)
+        except Exception as err:  # handle solver plugin failures, happens in some queries
+            self.log.error(err)
+            step = None
+        if step is None:
             self.speak_dialog("thats all")
             self.remove_context("WikiKnows")
-            self.idx = 0
         else:
-            self.speak(self.results[self.idx]["summary"])
+            self.speak(step["summary"])
             self.set_context("WikiKnows", "wikipedia")
-            self.display_wiki_entry(self.results[self.idx].get("title", "Wikipedia"))
-            self.idx += 1
+            self.display_wiki_entry(step.get("title", "Wikipedia"))
 
     def stop(self):
         self.gui.release()
 
+    def shutdown(self):
+        self.batcher.shutdown()
+
 
 if __name__ == "__main__":
     d = WikipediaSolver()
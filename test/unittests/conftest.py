@@ -0,0 +1,15 @@
+import pytest
+
+from skill_ovos_wikipedia import WikipediaSolver
+
+
+@pytest.fixture(autouse=True)
+def offline_solver(monkeypatch):
+    """solvers built by the tests, directly or by the skill, skip the warmup
+    requests and keep their cache in memory instead of the user's cache dir"""
+    init = WikipediaSolver.__init__
+
+    def __init__(self, config=None):
+        init(self, {"warmup": False, "cache_path": None, **(config or {})})
+
+    monkeypatch.setattr(WikipediaSolver, "__init__", __init__)
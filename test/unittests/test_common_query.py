@@ -20,12 +20,11 @@ class TestCommonQuery(unittest.TestCase):
 
         self.skill = WikipediaSkill()
         self.skill._startup(self.bus, "wikipedia_for_humans.test")
-        self.skill.wiki.long_answer = Mock()
-        self.skill.wiki.long_answer.return_value = [
-            {"title": "wikipedia_for_humans skill", "summary": "the answer is always 42"}
+        self.skill.wiki.iter_long_answer = Mock()
+        self.skill.wiki.iter_long_answer.return_value = [
+            {"title": "wikipedia_for_humans skill", "summary": "the answer is always 42",
+             "image": "/wikipedia_for_humans.jpeg"}
         ]
-        self.skill.wiki.get_image = Mock()
-        self.skill.wiki.get_image.return_value = "/wikipedia_for_humans.jpeg"
         self.bus.emitted_msgs = []
 
         self.cc = QuestionsAnswersSkill()
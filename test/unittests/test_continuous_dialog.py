@@ -85,3 +85,21 @@ class TestDialog(unittest.TestCase):
              'data': {'context': 'wikipedia_for_humans_testWikiKnows'},
              'type': 'remove_context'}, self.bus.emitted_msgs)
         self.assertFalse(self.skill.has_context)
+
+    def test_tell_more_failure(self):
+        def steps(*args, **kwargs):
+            yield {"title": "title 1", "summary": "this is the answer number 1"}
+            raise ConnectionError("translation failed")
+
+        self.skill.wiki.iter_long_answer = Mock(side_effect=steps)
+        self.skill.handle_search(Message("search_wikipedia_for_humans.intent",
+                                         {"query": "what is the speed of light"}))
+        self.bus.emitted_msgs = []
+
+        # "tell me more" - the next step fails, end the answer
+        self.skill.handle_tell_more(Message("WikiMore"))
+        spoken = [m for m in self.bus.emitted_msgs if m["type"] == "speak"]
+        self.assertEqual(len(spoken), 1)
+        self.assertEqual(spoken[0]["data"]["meta"],
+                         {'data': {}, 'dialog': 'thats all', 'skill': 'wikipedia_for_humans.test'})
+        self.assertFalse(self.skill.has_context)
@@ -0,0 +1,64 @@
+import json
+import unittest
+from unittest.mock import Mock
+
+from ovos_utils.messagebus import FakeBus, Message
+from skill_ovos_wikipedia import WikipediaSkill
+
+
+class TestSkillCache(unittest.TestCase):
+    def setUp(self):
+        self.bus = FakeBus()
+        self.bus.emitted_msgs = []
+
+        def get_msg(msg):
+            self.bus.emitted_msgs.append(json.loads(msg))
+
+        self.bus.on("message", get_msg)
+
+        self.skill = WikipediaSkill()
+        self.skill._startup(self.bus, "wikipedia_for_humans.test")
+        self.addCleanup(self.skill.shutdown)
+        self.skill.wiki.iter_long_answer = Mock()
+
+    def spoken(self):
+        return [m["data"]["meta"].get("dialog") or m["data"]["utterance"]
+                for m in self.bus.emitted_msgs if m["type"] == "speak"]
+
+    def test_misses(self):
+        self.assertEqual(self.skill.misses.ttl, 300)
+        self.skill.wiki.iter_long_answer.return_value = []
+        for _ in range(2):
+            self.skill.handle_search(Message("search_wikipedia_for_humans.intent",
+                                             {"query": "asdfgh"}))
+        self.assertEqual(self.spoken(), ["searching", "no_answer"] * 2)
+        # the second search is answered by the miss cache
+        self.assertEqual(self.skill.wiki.iter_long_answer.call_count, 1)
+
+    def test_common_query(self):
+        steps = [{"title": "Light", "summary": f"light fact number {i}", "image": "/light.jpeg"}
+                 for i in range(1, 4)]
+        self.skill.wiki.iter_long_answer.side_effect = lambda *args, **kwargs: iter(steps)
+        phrase = "what is the speed of light"
+        match = self.skill.CQS_match_query_phrase(phrase)
+        self.assertEqual(match[2], "light fact number 1")
+
+        # state left behind by some other query
+        self.skill.image = None
+        self.skill.results = iter([])
+        self.bus.emitted_msgs = []
+
+        self.assertEqual(self.skill.CQS_match_query_phrase(phrase.title()),
+                         (phrase.title(), match[1], match[2],
+                          {"query": phrase.title(), "image": "/light.jpeg",
+                           "title": "Light", "answer": "light fact number 1"}))
+        # answered from the cache, state restored for "tell me more"
+        self.assertEqual(self.skill.wiki.iter_long_answer.call_count, 1)
+        self.assertEqual(self.skill.image, "/light.jpeg")
+        self.assertIn({"context": "wikipedia_for_humans_testWikiKnows", "origin": "",
+                       "word": phrase.title()},
+                      [m["data"] for m in self.bus.emitted_msgs if m["type"] == "add_context"])
+
+        self.skill.handle_tell_more(Message("WikiMore"))
+        self.assertEqual(self.spoken(), ["light fact number 2"])
+        self.assertEqual(self.skill.wiki.iter_long_answer.call_count, 2)
@@ -0,0 +1,343 @@
+import asyncio
+import tempfile
+import time
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from os.path import join
+from threading import Event
+from unittest.mock import Mock, patch
+
+from skill_ovos_wikipedia import BatchedWikiClient, WikiCache, WikipediaSolver, _MISS
+
+
+class TestWikiCache(unittest.TestCase):
+    def test_lru_eviction(self):
+        cache = WikiCache(max_size=2)
+        cache.set("a", {"title": "a"})
+        cache.set("b", {"title": "b"})
+        cache.get("a")  # "b" is now the least recently used
+        cache.set("c", {"title": "c"})
+        self.assertEqual(cache.get("a"), {"title": "a"})
+        self.assertIs(cache.get("b"), _MISS)
+        self.assertEqual(cache.get("c"), {"title": "c"})
+
+    def test_ttl(self):
+        cache = WikiCache(ttl=60, negative_ttl=-1)
+        cache.set("hit", {"title": "hit"})
+        cache.set("miss", {})
+        self.assertEqual(cache.get("hit"), {"title": "hit"})
+        # empty results use the (here already expired) negative ttl
+        self.assertIs(cache.get("miss"), _MISS)
+
+    def test_stale(self):
+        cache = WikiCache(ttl=-1, stale_ttl=60)
+        cache.set("old", {"title": "old"})
+        self.assertIs(cache.get("old"), _MISS)
+        self.assertEqual(cache.lookup("old"), ({"title": "old"}, True))
+        # negative results are never served stale
+        cache.set("miss", {}, ttl=-1, stale_ttl=0)
+        self.assertEqual(cache.lookup("miss"), (_MISS, False))
+
+    def test_db_size(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = join(tmp, "cache.db")
+            cache = WikiCache(path=path, max_size=10)
+            for i in range(500):
+                cache.set(str(i), {"title": str(i)})
+            self.assertEqual(cache._db.execute("SELECT COUNT(*) FROM cache").fetchone()[0], 10)
+            # evicted entries are not reloaded from disk
+            self.assertIs(cache.get("0"), _MISS)
+            self.assertEqual(WikiCache(path=path).get("499"), {"title": "499"})
+
+    def test_shared_db(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = join(tmp, "cache.db")
+            caches = [WikiCache(path=path), WikiCache(path=path)]
+            start = time.monotonic()
+            for i in range(4):
+                caches[i % 2].set(str(i), {"title": str(i)})
+            # every write is committed, nothing waits on the other connection
+            self.assertLess(time.monotonic() - start, 1)
+            self.assertEqual(caches[1].get("2"), {"title": "2"})
+
+    def test_db_failure(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            cache = WikiCache(path=join(tmp, "cache.db"))
+            cache._db.close()
+            with patch("skill_ovos_wikipedia.LOG") as log:
+                cache.set("a", {"title": "a"})
+            log.error.assert_called_once()
+            # falls back to memory only
+            self.assertEqual(cache.get("a"), {"title": "a"})
+            self.assertIsNone(cache._db)
+
+    def test_key(self):
+        self.assertEqual(WikiCache.make_key("summary", "Isaac Newton ", "en"),
+                         WikiCache.make_key("summary", "isaac newton", "en"))
+        self.assertNotEqual(WikiCache.make_key("summary", "isaac newton", "en"),
+                            WikiCache.make_key("summary", "isaac newton", "pt"))
+
+
+class TestBatchedWikiClient(unittest.TestCase):
+    def test_batch(self):
+        calls = []
+
+        def lookup(phrase):
+            calls.append(phrase)
+            return phrase.upper()
+
+        client = BatchedWikiClient(lookup, window=0.2)
+        phrases = ["speed of light", "what is the speed of light", "speed of light"]
+        with ThreadPoolExecutor(len(phrases)) as pool:
+            answers = list(pool.map(client.apply, phrases))
+        client.shutdown()
+        self.assertEqual(answers, [p.upper() for p in phrases])
+        self.assertEqual(sorted(calls), sorted(phrases))
+
+    def test_errors(self):
+        def lookup(phrase):
+            raise ValueError(phrase)
+
+        client = BatchedWikiClient(lookup)
+        with self.assertRaises(ValueError):
+            client.apply("speed of light")
+        client.shutdown()
+
+    def test_lone_lookup(self):
+        client = BatchedWikiClient(str.upper, window=1)
+        start = time.monotonic()
+        self.assertEqual(client.apply("speed of light"), "SPEED OF LIGHT")
+        # nothing else queued, no need to wait for the window
+        self.assertLess(time.monotonic() - start, 0.5)
+        client.shutdown()
+
+    def test_no_head_of_line_blocking(self):
+        def lookup(phrase):
+            time.sleep(0.5)
+            return phrase
+
+        client = BatchedWikiClient(lookup)
+        start = time.monotonic()
+        with ThreadPoolExecutor(3) as pool:
+            futures = []
+            for phrase in ("light", "speed of light", "what is light"):
+                futures.append(pool.submit(client.apply, phrase))
+                time.sleep(0.02)
+            self.assertEqual([f.result() for f in futures],
+                             ["light", "speed of light", "what is light"])
+        # later probes do not wait for the first lookup to finish
+        self.assertLess(time.monotonic() - start, 0.9)
+        client.shutdown()
+
+    def test_shutdown(self):
+        release = Event()
+
+        def lookup(phrase):
+            release.wait(5)
+            return phrase
+
+        # a single thread, the second lookup waits for the first one
+        client = BatchedWikiClient(lookup, max_batch=1, timeout=5)
+        with ThreadPoolExecutor(2) as pool:
+            first = pool.submit(client.apply, "speed of light")
+            time.sleep(0.1)
+            queued = pool.submit(client.apply, "light")
+            time.sleep(0.1)
+            client.shutdown()
+            release.set()
+            self.assertEqual(first.result(), "speed of light")
+            with self.assertRaises(RuntimeError):
+                queued.result()
+        with self.assertRaises(RuntimeError):
+            client.apply("speed of light")
+
+
+class SolverTestCase(unittest.TestCase):
+    def setUp(self):
+        self.solver = WikipediaSolver(config={"warmup": False, "cache_path": None})
+        # REST api answers 404 unless a test says otherwise
+        self.rest = patch("skill_ovos_wikipedia._SESSION.get",
+                          return_value=Mock(status_code=404)).start()
+        self.addCleanup(patch.stopall)
+
+
+class TestSolverCache(SolverTestCase):
+    @patch("wikipedia_for_humans.summary", return_value="the answer is always 42")
+    @patch("wikipedia_for_humans.tldr", return_value="42")
+    @patch("wikipedia_for_humans.page_data",
+           return_value={"title": "42", "images": ["/42.jpeg"], "sections": []})
+    def test_get_data_cached(self, page_data, tldr, summary):
+        for _ in range(3):
+            data = self.solver.get_data("the answer")
+            self.assertEqual(data["summary"], "the answer is always 42")
+            self.assertEqual(data["short_answer"], "42")
+        self.assertEqual(page_data.call_count, 1)
+        self.assertEqual(tldr.call_count, 1)
+        self.assertEqual(summary.call_count, 1)
+
+    @patch("wikipedia_for_humans.summary", return_value="the answer. is always 42.")
+    @patch("wikipedia_for_humans.tldr", return_value="42")
+    @patch("wikipedia_for_humans.page_data",
+           return_value={"title": "42", "images": ["/42.jpeg"], "sections": []})
+    def test_expanded_answer_single_lookup(self, page_data, tldr, summary):
+        steps = list(self.solver.get_expanded_answer("the answer"))
+        self.assertEqual(steps[0]["summary"], "the answer.")
+        self.assertTrue(all(s["img"] == "/42.jpeg" for s in steps))
+        self.assertEqual(self.solver.get_data("the answer")["title"], "42")
+        self.assertEqual(page_data.call_count, 1)
+
+    @patch("wikipedia_for_humans.summary", return_value="the answer is always 42")
+    @patch("wikipedia_for_humans.tldr", return_value="42")
+    @patch("wikipedia_for_humans.page_data", side_effect=ConnectionError)
+    def test_aget_data(self, page_data, tldr, summary):
+        # a failing endpoint does not take down the other lookups
+        data = asyncio.run(self.solver.aget_data("what is the answer"))
+        self.assertEqual(data["summary"], "the answer is always 42")
+        self.assertEqual(data["title"], "answer")
+
+    @patch("wikipedia_for_humans.ask_about", return_value="the sun is heavy")
+    @patch("wikipedia_for_humans.tldr_about", return_value="heavy")
+    @patch("wikipedia_for_humans.page_data", side_effect=[
+        ConnectionError,
+        {"title": "Sun", "summary": "the sun is a star. it is heavy.",
+         "images": ["/sun.jpeg"], "sections": [{"title": "mass", "text": "very heavy."}]}
+    ])
+    def test_failed_lookup_not_cached(self, page_data, tldr_about, ask_about):
+        self.solver.wiki_cache = WikiCache(negative_ttl=-1)
+        # degraded answer from the secondary search while page_data is down
+        data = self.solver.get_data("what is the mass of the sun")
+        self.assertEqual(data["summary"], "the sun is heavy")
+        # page_data is retried instead of serving the degraded answer for a day
+        data = self.solver.get_data("what is the mass of the sun")
+        self.assertEqual(data["title"], "Sun")
+        self.assertEqual(data["images"], ["/sun.jpeg"])
+        self.assertEqual(len(data["sections"]), 1)
+        self.assertEqual(page_data.call_count, 2)
+
+
+class TestSolver(SolverTestCase):
+    def test_subquery(self):
+        self.assertEqual(self.solver.get_secondary_search("what is the speed of light"),
+                         ("light", "speed"))
+
+    def test_image_from_data(self):
+        self.assertEqual(self.solver.get_image("light", data={"images": ["/light.jpeg"]}),
+                         "/light.jpeg")
+        self.assertIsNone(self.solver.get_image("light", data={"images": []}))
+        self.assertIsNone(self.solver.get_image("light", data={}))
+
+    @patch("wikipedia_for_humans.summary", return_value="the answer. is always 42.")
+    @patch("wikipedia_for_humans.tldr", return_value="42")
+    @patch("wikipedia_for_humans.page_data",
+           return_value={"title": "42", "images": ["/42.jpeg"], "sections": []})
+    def test_long_answer_image(self, page_data, tldr, summary):
+        steps = self.solver.long_answer("the answer")
+        self.assertIsInstance(steps, list)
+        self.assertEqual(steps[0]["image"], "/42.jpeg")
+        self.assertEqual(page_data.call_count, 1)
+
+    @patch("wikipedia_for_humans.summary", return_value="the answer is always 42")
+    @patch("wikipedia_for_humans.tldr", return_value="42")
+    @patch("wikipedia_for_humans.page_data",
+           return_value={"title": "42", "images": ["/42.jpeg"], "sections": []})
+    def test_stale_while_revalidate(self, page_data, tldr, summary):
+        # everything cached by the first lookup is already expired
+        self.solver.wiki_cache = WikiCache(ttl=-1, stale_ttl=60)
+        self.assertEqual(self.solver.get_data("the answer")["summary"],
+                         "the answer is always 42")
+        self.solver.wiki_cache.ttl = 60
+        summary.return_value = "the answer is still 42"
+
+        # expired entry is served while a refresh runs in the background
+        self.assertEqual(self.solver.get_data("the answer")["summary"],
+                         "the answer is always 42")
+        key = WikiCache.make_key("_fetch_all", "the answer", "en")
+        for _ in range(50):
+            if self.solver.wiki_cache.get(key) is not _MISS:
+                break
+            time.sleep(0.1)
+        self.assertEqual(self.solver.get_data("the answer")["summary"],
+                         "the answer is still 42")
+
+    @patch("wikipedia_for_humans.summary", return_value="the answer is always 42")
+    @patch("wikipedia_for_humans.tldr", return_value="42")
+    @patch("wikipedia_for_humans.page_data",
+           return_value={"title": "42", "images": ["/42.jpeg"], "sections": []})
+    def test_degraded_refresh(self, page_data, tldr, summary):
+        self.solver.wiki_cache = WikiCache(ttl=-1, stale_ttl=60)
+        self.solver.get_data("what is the answer")
+        page_data.side_effect = ConnectionError
+
+        with patch("skill_ovos_wikipedia.LOG") as log:
+            # stale entry is served while the refresh fails in the background
+            self.assertEqual(self.solver.get_data("what is the answer")["title"], "42")
+            key = WikiCache.make_key("_fetch_all", "what is the answer", "en")
+            # wait for the background refresh to finish
+            for _ in range(50):
+                if not self.solver.wiki_cache.start_refresh(key):
+                    time.sleep(0.1)
+                    continue
+                self.solver.wiki_cache.end_refresh(key)
+                break
+        self.assertEqual(page_data.call_count, 2)
+        # the failed lookup is logged, the refresh itself does not fail
+        self.assertFalse(any("failed to refresh" in str(c) for c in log.error.call_args_list))
+        # the stale value is kept
+        value, is_stale = self.solver.wiki_cache.lookup(key)
+        self.assertEqual((value["title"], is_stale), ("42", True))
+
+    @patch("wikipedia_for_humans.summary")
+    @patch("wikipedia_for_humans.tldr")
+    @patch("wikipedia_for_humans.page_data",
+           return_value={"title": "Speed of light", "images": ["/light.jpeg"], "sections": [],
+                         "summary": "The speed of light (c) is 299792458 m/s. It is exact."})
+    def test_page_summary(self, page_data, tldr, summary):
+        data = self.solver.get_data("speed of light")
+        self.assertEqual(data["short_answer"], "The speed of light is 299792458 m/s.")
+        # the page summary is used as is, no further requests
+        tldr.assert_not_called()
+        summary.assert_not_called()
+        self.rest.assert_not_called()
+
+    @patch("wikipedia_for_humans.summary")
+    @patch("wikipedia_for_humans.tldr")
+    @patch("wikipedia_for_humans.page_data", return_value={})
+    def test_rest_summary(self, page_data, tldr, summary):
+        self.rest.return_value = Mock(status_code=200, json=Mock(return_value={
+            "type": "standard",
+            "title": "Isaac Newton",
+            "extract": "Sir Isaac Newton was an English polymath. He was a physicist.",
+            "thumbnail": {"source": "/thumb.jpeg"},
+            "originalimage": {"source": "/newton.jpeg"}
+        }))
+        data = self.solver.get_data("who is isaac newton")
+        self.assertEqual(data["title"], "Isaac Newton")
+        self.assertEqual(data["summary"],
+                         "Sir Isaac Newton was an English polymath. He was a physicist.")
+        self.assertEqual(data["images"], ["/newton.jpeg"])
+        # queried with the keyword, not the whole utterance
+        self.assertTrue(self.rest.call_args[0][0].endswith(
+            "/api/rest_v1/page/summary/isaac_newton"))
+        # no fallback to the slower wikipedia_for_humans lookups
+        tldr.assert_not_called()
+        summary.assert_not_called()
+
+    @patch.object(WikipediaSolver, "get_expanded_answer", return_value=[
+        {"title": "light", "summary": "light is fast.", "img": "/light.jpeg"},
+        {"title": "light", "summary": "it is a wave.", "img": "/light.jpeg"},
+        {"title": "history", "summary": "it was measured.", "img": "/light.jpeg"}
+    ])
+    def test_long_answer_batch_translate(self, expanded):
+        self.solver.translator.translate = Mock(side_effect=lambda text, tgt, src: text.upper())
+        steps = list(self.solver.long_answer("what is light", lang="pt"))
+        self.assertEqual([s["summary"] for s in steps],
+                         ["LIGHT IS FAST.", "IT IS A WAVE.", "IT WAS MEASURED."])
+        self.assertEqual([s["title"] for s in steps], ["LIGHT", "LIGHT", "HISTORY"])
+        self.assertEqual(steps[0]["image"], "/light.jpeg")
+        # one call for the query, then one per title and per section text
+        self.assertEqual(self.solver.translator.translate.call_count, 5)
+
+        # translations are cached
+        self.solver.translator.translate.reset_mock()
+        list(self.solver.long_answer("what is light", lang="pt"))
+        self.assertEqual(self.solver.translator.translate.call_count, 1)